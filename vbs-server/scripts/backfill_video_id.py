@@ -0,0 +1,54 @@
+"""
+Backfill video_id on legacy frame documents.
+
+Frame queries (/video-frames, /video-list, /neighbors) select a video by
+video_id equality. Documents imported before the field existed only carry
+s3_key; this script derives video_id ("L21_V001") from it.
+
+frame_idx (the video frame index used for ordering and in frame_n) cannot
+be derived from s3_key, whose number is the keyframe counter, so documents
+missing it are only counted. Re-import them with frame_idx set.
+
+Usage (from the vbs-server directory, with MONGO_URI/DB_NAME/COLLECTION set
+or in src/.env):
+    python scripts/backfill_video_id.py
+    python scripts/backfill_video_id.py --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# database.py lives in src/ next to main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database  # noqa: E402
+
+
+async def run(batch_size: int):
+    database.connect()
+    try:
+        updated = await database.backfill_video_id(batch_size)
+        print(f"✅ Backfilled video_id on {updated} documents")
+
+        collection = database.get_db()[database.COLLECTION]
+        missing_frame_idx = await collection.count_documents({"frame_idx": {"$exists": False}})
+        if missing_frame_idx:
+            print(f"⚠️ {missing_frame_idx} documents have no frame_idx; "
+                  "they are unordered in /video-frames and never returned by /neighbors")
+    finally:
+        await database.close_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill video_id on legacy frame documents")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Updates sent per bulk write (default: 1000)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
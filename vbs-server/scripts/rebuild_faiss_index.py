@@ -0,0 +1,131 @@
+"""
+Rebuild a flat FAISS index as an approximate (IVF, HNSW or OPQ+IVFPQ) index.
+
+A flat index compares every query against all stored vectors. This script
+reads an existing flat index, reconstructs its vectors and re-indexes them
+with a FAISS index_factory string. Vector ids are preserved, so the frame id
+mapping in FRAME_IDS_PATH stays valid. Vectors are L2-normalized and indexed
+with inner product, so search scores are the cosine similarities that
+search_engine.py ranks by.
+
+Recall tradeoff: IVF indexes only scan NPROBE of their lists per query and
+HNSW explores HNSW_EF_SEARCH candidates (both read by search_engine.py at
+load time). Higher values raise recall towards the flat index at the cost of
+latency.
+
+Memory tradeoff: "Flat" and "HNSW" indexes keep every float32 vector
+resident. "OPQ32_128,IVF1024,PQ32x8" rotates vectors to 128 dimensions and
+stores 32-byte PQ codes instead, a large memory cut at some recall cost.
+
+The input index is never modified. After the rebuild, a recall check compares
+the new index with exact inner product search over the same normalized
+vectors (--eval-queries 0 skips it).
+
+Usage (from the vbs-server directory):
+    python scripts/rebuild_faiss_index.py models/batch1.bin models/batch1_ivf.bin
+    python scripts/rebuild_faiss_index.py models/batch1.bin models/batch1_hnsw.bin --factory HNSW32
+    python scripts/rebuild_faiss_index.py models/batch1.bin models/batch1_opq.bin --factory OPQ32_128,IVF1024,PQ32x8
+
+Then point FAISS_INDEX_PATH at the output file.
+"""
+
+import argparse
+import sys
+
+import faiss
+import numpy as np
+
+
+def rebuild_index(vectors: np.ndarray, factory: str) -> faiss.Index:
+    """
+    Index L2-normalized vectors with an index_factory string.
+
+    Args:
+        vectors: L2-normalized float32 vectors of shape (N, D), in id order
+        factory: FAISS index_factory string (e.g. "IVF4096,Flat", "HNSW32")
+
+    Returns:
+        Trained and populated inner product index
+    """
+    new_index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    if not new_index.is_trained:
+        print(f"🔧 Training {factory} on {len(vectors)} vectors...")
+        new_index.train(vectors)
+    new_index.add(vectors)
+    return new_index
+
+
+def evaluate_recall(vectors: np.ndarray, index: faiss.Index, num_queries: int,
+                    k: int = 10, nprobe: int = 16, ef_search: int = 64) -> float:
+    """
+    Measure recall@k of a rebuilt index against exact inner product search.
+
+    Args:
+        vectors: The L2-normalized vectors the rebuilt index was built from
+        index: Rebuilt index to evaluate
+        num_queries: Number of stored vectors sampled as queries
+        k: Number of neighbors compared per query
+        nprobe: IVF lists scanned per query (ignored for non-IVF indexes)
+        ef_search: HNSW candidates explored per query (ignored for non-HNSW indexes)
+
+    Returns:
+        Mean fraction of the exact top-k found in the rebuilt index's top-k
+    """
+    # Same vectors and metric as the rebuilt index, searched exhaustively
+    ground_truth = faiss.IndexFlatIP(vectors.shape[1])
+    ground_truth.add(vectors)
+
+    rng = np.random.default_rng(0)
+    num_queries = min(num_queries, len(vectors))
+    queries = vectors[rng.choice(len(vectors), size=num_queries, replace=False)]
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+    _, expected = ground_truth.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(np.intersect1d(e, f)) for e, f in zip(expected, found))
+    return hits / (num_queries * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a flat FAISS index as IVF/HNSW/IVFPQ")
+    parser.add_argument("input", help="Existing flat index (e.g. models/batch1.bin)")
+    parser.add_argument("output", help="Where to write the rebuilt index")
+    parser.add_argument("--factory", default="IVF4096,Flat",
+                        help="FAISS index_factory string (default: IVF4096,Flat)")
+    parser.add_argument("--eval-queries", type=int, default=1000,
+                        help="Stored vectors sampled to check recall@k (0 to skip)")
+    parser.add_argument("--k", type=int, default=10, help="k for the recall check")
+    parser.add_argument("--nprobe", type=int, default=16,
+                        help="IVF lists scanned during the recall check (match NPROBE)")
+    parser.add_argument("--ef-search", type=int, default=64,
+                        help="HNSW candidates explored during the recall check (match HNSW_EF_SEARCH)")
+    args = parser.parse_args()
+
+    index = faiss.read_index(args.input)
+    print(f"✅ Loaded {args.input} ({type(index).__name__}, {index.ntotal} vectors, d={index.d})")
+
+    if not isinstance(index, faiss.IndexFlat):
+        print(f"⚠️ {args.input} is not a flat index, nothing to rebuild")
+        sys.exit(1)
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    faiss.normalize_L2(vectors)
+
+    new_index = rebuild_index(vectors, args.factory)
+    faiss.write_index(new_index, args.output)
+    print(f"✅ Wrote {args.factory} index to {args.output} ({new_index.ntotal} vectors)")
+
+    if args.eval_queries > 0:
+        recall = evaluate_recall(vectors, new_index, args.eval_queries, args.k,
+                                 args.nprobe, args.ef_search)
+        print(f"📊 recall@{args.k} vs exact search: {recall:.3f} "
+              f"(nprobe={args.nprobe}, efSearch={args.ef_search})")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,6 @@ __version__ = "2.0.0"
 __author__ = "VBS Team"
 __email__ = "team@vbs.ai"
 
-from .main import create_app
+from .database import get_db
 
-__all__ = ["create_app"]
\ No newline at end of file
+__all__ = ["get_db"]
\ No newline at end of file
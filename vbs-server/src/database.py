@@ -1,11 +1,14 @@
 """Database operations for VBS file_metadata collection."""
 
 import os
-import re
+import asyncio
 import logging
 import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
-from motor.motor_asyncio import AsyncIOMotorClient
+import bson
+import pymongo
+from pymongo import AsyncMongoClient, UpdateOne
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,12 +21,61 @@ logger = logging.getLogger(__name__)
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
 DB_NAME = os.getenv('DB_NAME', 'data')
 COLLECTION = os.getenv('COLLECTION', 'file_metadata')
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '10'))
+
+# Global MongoDB client, created by connect() on first use or server startup
+client: Optional[AsyncMongoClient] = None
+db = None
+files_collection = None
+video_metadata_collection = None
+
+# Fields returned for frame documents (everything the API responses use)
+FRAME_PROJECTION = {
+    "_id": 0,
+    "s3_key": 1,
+    "public_url": 1,
+    "file_size": 1,
+    "content_type": 1,
+    "video_id": 1,
+    "frame_idx": 1,
+    "frame_n": 1,
+    "pts_time": 1,
+    "fps": 1,
+    "ocr_text": 1,
+}
+
+# Fields read from video_metadata documents
+VIDEO_METADATA_PROJECTION = {"_id": 0, "video_id": 1, "title": 1, "watch_url": 1}
+
+# In-process cache for video_metadata documents, which don't change while
+# the server runs. Entries expire after VIDEO_METADATA_CACHE_TTL seconds.
+VIDEO_METADATA_CACHE_SIZE = int(os.getenv('VIDEO_METADATA_CACHE_SIZE', '10000'))
+VIDEO_METADATA_CACHE_TTL = float(os.getenv('VIDEO_METADATA_CACHE_TTL', '3600'))
+_video_metadata_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _get_cached_video_metadata(video_id: str) -> Optional[Dict[str, Any]]:
+    """Return cached metadata for video_id, or None if absent or expired."""
+    entry = _video_metadata_cache.get(video_id)
+    if entry is None:
+        return None
+
+    expires_at, metadata = entry
+    if expires_at < time.monotonic():
+        del _video_metadata_cache[video_id]
+        return None
+
+    _video_metadata_cache.move_to_end(video_id)
+    return metadata
+
 
-# Global MongoDB client
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
-files_collection = db[COLLECTION]
-video_metadata_collection = db['video_metadata']
+def _cache_video_metadata(video_id: str, metadata: Dict[str, Any]):
+    """Store metadata for video_id, evicting the least recently used entries."""
+    _video_metadata_cache[video_id] = (time.monotonic() + VIDEO_METADATA_CACHE_TTL, metadata)
+    _video_metadata_cache.move_to_end(video_id)
+    while len(_video_metadata_cache) > VIDEO_METADATA_CACHE_SIZE:
+        _video_metadata_cache.popitem(last=False)
 
 
 def parse_s3_key(s3_key: str) -> Tuple[str, str, int]:
@@ -88,11 +140,60 @@ def parse_frame_n(frame_n: str) -> Tuple[str, str, int]:
     return l, v, frame_index
 
 
+def connect():
+    """Create the shared MongoDB client and collection handles (once per process)."""
+    global client, db, files_collection, video_metadata_collection
+
+    if client is not None:
+        return
+
+    # Without the C extensions every BSON document is decoded in pure Python
+    if not (pymongo.has_c() and bson.has_c()):
+        logger.warning("PyMongo C extensions unavailable, BSON decoding will be slow")
+
+    client = AsyncMongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        tz_aware=False
+    )
+    db = client[DB_NAME]
+    files_collection = db[COLLECTION]
+    video_metadata_collection = db['video_metadata']
+
+
+def get_db():
+    """Return the shared database handle, connecting on first use."""
+    connect()
+    return db
+
+
+def _files():
+    """Return the file_metadata collection, connecting on first use."""
+    connect()
+    return files_collection
+
+
+def _video_metadata():
+    """Return the video_metadata collection, connecting on first use."""
+    connect()
+    return video_metadata_collection
+
+
+async def ensure_indexes():
+    """Create the indexes the frame and metadata queries rely on (no-op if they exist)."""
+    try:
+        await _files().create_index([("video_id", 1), ("frame_idx", 1)])
+        await _video_metadata().create_index([("video_id", 1)], unique=True)
+    except Exception as e:
+        logger.error("Failed to create indexes: %s", e)
+
+
 async def health_check() -> Dict[str, Any]:
     """Check MongoDB connection health."""
     try:
-        await client.admin.command('ping')
-        await files_collection.find_one()
+        await get_db().client.admin.command('ping')
+        await _files().find_one({}, {"_id": 1})
 
         return {
             "status": "healthy",
@@ -120,9 +221,9 @@ async def get_frames_by_s3_keys(s3_keys: List[str]) -> List[Dict[str, Any]]:
     if not s3_keys:
         return []
 
-    cursor = files_collection.find(
+    cursor = _files().find(
         {"s3_key": {"$in": s3_keys}},
-        {"_id": 0}  # Exclude MongoDB _id field
+        FRAME_PROJECTION
     )
 
     docs = await cursor.to_list(length=len(s3_keys))
@@ -140,58 +241,46 @@ async def find_neighbors(frame_n: str, limit: int = 20) -> List[Dict[str, Any]]:
     Returns:
         List of neighboring frame documents sorted by frame index
     """
+    if limit < 0:
+        return []  # Negative limits would reach cursor.limit()/to_list() and raise
+
     try:
         # Parse target frame
         l, v, target_frame_idx = parse_frame_n(frame_n)
+    except ValueError:
+        return []  # Invalid frame_n format
 
-        # Find all frames in the same video using video_id field
-        video_id = f"{l}_{v}"
-        print("Searching neighbors for video_id:", video_id)
-        cursor = files_collection.find(
-            {"video_id": video_id},
-            {"_id": 0}
+    video_id = f"{l}_{v}"
+    logger.debug("Searching neighbors for video_id: %s", video_id)
+
+    # Fetch the target plus the frames before it, and the frames after it,
+    # as two indexed range scans on (video_id, frame_idx)
+    half_limit = limit // 2
+    before_cursor = _files().find(
+        {"video_id": video_id, "frame_idx": {"$lte": target_frame_idx}},
+        FRAME_PROJECTION
+    ).sort("frame_idx", -1).limit(half_limit + 1)
+
+    if half_limit > 0:
+        after_cursor = _files().find(
+            {"video_id": video_id, "frame_idx": {"$gt": target_frame_idx}},
+            FRAME_PROJECTION
+        ).sort("frame_idx", 1).limit(half_limit)
+
+        before, after = await asyncio.gather(
+            before_cursor.to_list(length=half_limit + 1),
+            after_cursor.to_list(length=half_limit)
         )
+    else:
+        # limit(0) means "no limit" to MongoDB, so skip the after-range query
+        before, after = await before_cursor.to_list(length=1), []
 
-        docs = await cursor.to_list(length=1000)
-
-        if not docs:
-            print("No documents found for video_id:", video_id)
-            return []
-
-        # Extract frame indices and sort
-        frame_data = []
-        for doc in docs:
-            try:
-                frame_idx = doc.get("frame_idx")
-                if frame_idx is not None:
-                    frame_data.append((frame_idx, doc))
-            except (KeyError, TypeError):
-                continue  # Skip documents without valid frame_idx
-
-        frame_data.sort(key=lambda x: x[0])  # Sort by frame index
-
-        # Find target frame index
-        target_idx = None
-        for i, (frame_idx, _) in enumerate(frame_data):
-            if frame_idx == target_frame_idx:
-                target_idx = i
-                break
-
-        if target_idx is None:
-            print("Target frame not found:", frame_n)
-            return []  # Target frame not found
+    if not before or before[0].get("frame_idx") != target_frame_idx:
+        logger.debug("Target frame not found: %s", frame_n)
+        return []  # Target frame not found
 
-        # Select neighbors around target
-        half_limit = limit // 2
-        start_idx = max(0, target_idx - half_limit)
-        end_idx = min(len(frame_data), target_idx + half_limit + 1)
-
-        neighbor_frames = [frame_data[i][1] for i in range(start_idx, end_idx)]
-
-        return neighbor_frames
-
-    except ValueError:
-        return []  # Invalid frame_n format
+    before.reverse()
+    return before + after
 
 
 async def find_video_frames(l: str, v: str, limit: int = 100) -> List[Dict[str, Any]]:
@@ -204,30 +293,14 @@ async def find_video_frames(l: str, v: str, limit: int = 100) -> List[Dict[str,
         limit: Maximum number of frames to return
 
     Returns:
-        List of frame documents sorted by frame number
+        List of frame documents sorted by frame index
     """
-    video_prefix = f"{l}_{v}_"
-
-    cursor = files_collection.find(
-        {"s3_key": {"$regex": f"^{re.escape(video_prefix)}"}},
-        {"_id": 0}
-    ).limit(limit)
-
-    docs = await cursor.to_list(length=limit)
-
-    # Sort by frame number
-    frame_data = []
-    for doc in docs:
-        try:
-            _, _, frame_num = parse_s3_key(doc["s3_key"])
-            frame_data.append((frame_num, doc))
-        except ValueError:
-            continue
-
-    frame_data.sort(key=lambda x: x[0])
-    sorted_frames = [doc for _, doc in frame_data]
+    cursor = _files().find(
+        {"video_id": f"{l}_{v}"},
+        FRAME_PROJECTION
+    ).sort("frame_idx", 1).limit(limit)
 
-    return sorted_frames
+    return await cursor.to_list(length=limit)
 
 
 async def get_video_list() -> List[Dict[str, Any]]:
@@ -237,36 +310,26 @@ async def get_video_list() -> List[Dict[str, Any]]:
     Returns:
         List of video information dictionaries
     """
-    # Aggregate to get unique video prefixes
+    # Group on video_id (prefix of the (video_id, frame_idx) index)
     pipeline = [
-        {
-            "$group": {
-                "_id": {
-                    "$substr": ["$s3_key", 0, {"$indexOfBytes": ["$s3_key", "_", 6]}]
-                },
-                "count": {"$sum": 1}
-            }
-        },
+        {"$group": {"_id": "$video_id", "count": {"$sum": 1}}},
         {"$sort": {"_id": 1}}
     ]
 
-    cursor = files_collection.aggregate(pipeline)
+    cursor = await _files().aggregate(pipeline)
     results = await cursor.to_list(length=1000)
 
     videos = []
     for result in results:
-        video_prefix = result["_id"]
-        if video_prefix and '_' in video_prefix:
-            try:
-                l, v = video_prefix.split('_')
-                videos.append({
-                    "l": l,
-                    "v": v,
-                    "frame_count": result["count"],
-                    "video_prefix": video_prefix
-                })
-            except ValueError:
-                continue
+        video_id = result["_id"]
+        if video_id and '_' in video_id:
+            l, v = video_id.split('_', 1)
+            videos.append({
+                "l": l,
+                "v": v,
+                "frame_count": result["count"],
+                "video_prefix": video_id
+            })
 
     return videos
 
@@ -281,25 +344,67 @@ async def get_video_metadata(video_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Video metadata document or None if not found
     """
+    cached = _get_cached_video_metadata(video_id)
+    if cached is not None:
+        return cached
+
     try:
-        logger.debug(f"Querying video_metadata collection for video_id: {video_id}")
-        result = await video_metadata_collection.find_one(
+        logger.debug("Querying video_metadata collection for video_id: %s", video_id)
+        result = await _video_metadata().find_one(
             {"video_id": video_id},
-            {"_id": 0}
+            VIDEO_METADATA_PROJECTION
         )
         if result:
-            title = result.get('title', 'Unknown')[:50]
-            watch_url = result.get('watch_url', '')
-            logger.debug(f"Found metadata for {video_id}: title='{title}...', has_watch_url={bool(watch_url)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Found metadata for %s: title='%s...', has_watch_url=%s",
+                             video_id, result.get('title', 'Unknown')[:50], bool(result.get('watch_url')))
+            _cache_video_metadata(video_id, result)
             return result
         else:
-            logger.debug(f"No metadata document found for video_id: {video_id}")
+            logger.debug("No metadata document found for video_id: %s", video_id)
             return None
     except Exception as e:
-        logger.error(f"Database error fetching video metadata for {video_id}: {e}")
+        logger.error("Database error fetching video metadata for %s: %s", video_id, e)
         return None
 
 
+async def get_video_metadata_batch(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get video metadata for several videos, querying only cache misses
+    in a single round-trip.
+
+    Args:
+        video_ids: Video identifiers (e.g., ["K05_V009", "K05_V010"])
+
+    Returns:
+        Mapping of video_id to metadata document (missing videos are omitted)
+    """
+    metadata_by_id = {}
+    missing_ids = []
+    for video_id in video_ids:
+        cached = _get_cached_video_metadata(video_id)
+        if cached is not None:
+            metadata_by_id[video_id] = cached
+        else:
+            missing_ids.append(video_id)
+
+    if not missing_ids:
+        return metadata_by_id
+
+    try:
+        cursor = _video_metadata().find(
+            {"video_id": {"$in": missing_ids}},
+            VIDEO_METADATA_PROJECTION
+        )
+        async for doc in cursor:
+            metadata_by_id[doc["video_id"]] = doc
+            _cache_video_metadata(doc["video_id"], doc)
+    except Exception as e:
+        logger.error("Database error fetching video metadata for %d videos: %s", len(missing_ids), e)
+
+    return metadata_by_id
+
+
 def generate_watch_url(video_metadata: Dict[str, Any], pts_time: Optional[float]) -> str:
     """
     Generate timestamped YouTube URL from video metadata and frame timestamp.
@@ -321,18 +426,19 @@ def generate_watch_url(video_metadata: Dict[str, Any], pts_time: Optional[float]
 
 async def enrich_frames_with_watch_urls(frames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Add timestamped YouTube watch URLs and video FPS to frame documents.
+    Add timestamped YouTube watch URLs, video FPS and image_id to frame documents.
 
     Args:
         frames: List of frame documents from file_metadata collection
 
     Returns:
-        List of enriched frame documents with watch_url and video_fps fields
+        The same frame documents, updated in place with watch_url, video_fps
+        and image_id fields
     """
     start_time = time.time()
     frame_count = len(frames)
 
-    logger.info(f"Starting watch URL enrichment for {frame_count} frames")
+    logger.info("Starting watch URL enrichment for %d frames", frame_count)
 
     if not frames:
         logger.info("No frames provided, returning empty list")
@@ -344,76 +450,123 @@ async def enrich_frames_with_watch_urls(frames: List[Dict[str, Any]]) -> List[Di
 
     frames_without_video_id = sum(1 for frame in frames if not frame.get("video_id"))
 
-    logger.info(f"Found {len(video_ids_clean)} unique video_ids from {frame_count} frames")
+    logger.info("Found %d unique video_ids from %d frames", len(video_ids_clean), frame_count)
     if frames_without_video_id > 0:
-        logger.warning(f"{frames_without_video_id} frames missing video_id field")
-    logger.debug(f"Video IDs to process: {list(video_ids_clean)}")
+        logger.warning("%d frames missing video_id field", frames_without_video_id)
+    logger.debug("Video IDs to process: %s", video_ids_clean)
 
     # Batch retrieve video metadata for all unique video IDs
-    video_metadata_cache = {}
-    metadata_found_count = 0
-    metadata_missing_count = 0
-
-    logger.info(f"Retrieving metadata for {len(video_ids_clean)} video_ids")
-
-    for video_id in video_ids_clean:
-        logger.debug(f"Fetching metadata for video_id: {video_id}")
-        metadata = await get_video_metadata(video_id)
-        if metadata:
-            video_metadata_cache[video_id] = metadata
-            metadata_found_count += 1
-            title_preview = metadata.get('title', 'N/A')[:50]
-            logger.debug(f"Metadata found for {video_id}: {title_preview}...")
-        else:
-            metadata_missing_count += 1
-            logger.warning(f"No metadata found for video_id: {video_id}")
+    logger.info("Retrieving metadata for %d video_ids", len(video_ids_clean))
+
+    video_metadata_cache = await get_video_metadata_batch(list(video_ids_clean))
+    metadata_found_count = len(video_metadata_cache)
+    metadata_missing_count = len(video_ids_clean) - metadata_found_count
 
-    logger.info(f"Video metadata retrieval complete: {metadata_found_count} found, {metadata_missing_count} missing")
+    # Per-frame/per-video debug arguments are only built when DEBUG is on
+    debug = logger.isEnabledFor(logging.DEBUG)
 
-    # Enrich each frame with watch URL
-    enriched_frames = []
+    for video_id in video_ids_clean - video_metadata_cache.keys():
+        logger.warning("No metadata found for video_id: %s", video_id)
+    if debug:
+        for video_id, metadata in video_metadata_cache.items():
+            logger.debug("Metadata found for %s: %s...", video_id, metadata.get('title', 'N/A')[:50])
+
+    logger.info("Video metadata retrieval complete: %d found, %d missing",
+                metadata_found_count, metadata_missing_count)
+
+    # Enrich each frame with watch URL (in place, the documents are ours)
     frames_enriched = 0
     frames_skipped = 0
 
-    logger.info(f"Starting frame enrichment process")
+    logger.info("Starting frame enrichment process")
 
     for i, frame in enumerate(frames):
-        frame_copy = frame.copy()
         video_id = frame.get("video_id")
         pts_time = frame.get("pts_time")
 
         if video_id and video_id in video_metadata_cache:
-            watch_url = generate_watch_url(video_metadata_cache[video_id], pts_time)
-            frame_copy["watch_url"] = watch_url
-            frame_copy["video_fps"] = frame.get("fps")  # Add FPS from frame data
+            frame["watch_url"] = generate_watch_url(video_metadata_cache[video_id], pts_time)
             frames_enriched += 1
-            logger.debug(f"Frame {i+1}: Generated watch URL for {video_id} at {pts_time}s, FPS={frame.get('fps')}")
+            if debug:
+                logger.debug("Frame %d: Generated watch URL for %s at %ss, FPS=%s",
+                             i + 1, video_id, pts_time, frame.get('fps'))
         else:
             # Fallback: empty watch_url if video metadata not found
-            frame_copy["watch_url"] = ""
-            frame_copy["video_fps"] = frame.get("fps")  # Include FPS even without watch_url
+            frame["watch_url"] = ""
             frames_skipped += 1
-            if not video_id:
-                logger.debug(f"Frame {i+1}: Skipped - no video_id, FPS={frame.get('fps')}")
-            else:
-                logger.debug(f"Frame {i+1}: Skipped - no metadata for {video_id}, FPS={frame.get('fps')}")
+            if debug:
+                if not video_id:
+                    logger.debug("Frame %d: Skipped - no video_id, FPS=%s", i + 1, frame.get('fps'))
+                else:
+                    logger.debug("Frame %d: Skipped - no metadata for %s, FPS=%s",
+                                 i + 1, video_id, frame.get('fps'))
 
-        enriched_frames.append(frame_copy)
+        frame["video_fps"] = frame.get("fps")  # Include FPS even without watch_url
+        # frame_n is the display identifier, fall back to s3_key
+        frame["image_id"] = frame.get("frame_n", frame.get("s3_key"))
 
     # Performance and summary logging
     end_time = time.time()
     processing_time = end_time - start_time
     enrichment_rate = (frames_enriched / frame_count) * 100 if frame_count > 0 else 0
 
-    logger.info(f"Watch URL enrichment completed in {processing_time:.3f}s")
-    logger.info(f"Enrichment summary: {frames_enriched}/{frame_count} frames enriched ({enrichment_rate:.1f}%)")
+    logger.info("Watch URL enrichment completed in %.3fs", processing_time)
+    logger.info("Enrichment summary: %d/%d frames enriched (%.1f%%)",
+                frames_enriched, frame_count, enrichment_rate)
 
     if frames_skipped > 0:
-        logger.info(f"Frames skipped: {frames_skipped} (missing video_id or metadata)")
+        logger.info("Frames skipped: %d (missing video_id or metadata)", frames_skipped)
+
+    return frames
+
+
+async def backfill_video_id(batch_size: int = 1000) -> int:
+    """
+    Set video_id on legacy frame documents that predate the field.
+
+    Frame queries select videos by video_id equality, so documents without
+    it are invisible to them. Run once after importing old data, via
+    scripts/backfill_video_id.py.
+
+    Args:
+        batch_size: Number of updates sent per bulk write
+
+    Returns:
+        Number of documents updated
+    """
+    cursor = _files().find(
+        {"video_id": {"$exists": False}},
+        {"_id": 1, "s3_key": 1}
+    )
+
+    updates = []
+    updated_count = 0
+    async for doc in cursor:
+        s3_key = doc.get("s3_key") or ""
+        try:
+            l, v, _ = parse_s3_key(s3_key)
+        except ValueError:
+            logger.warning("Skipping document with invalid s3_key: %s", s3_key)
+            continue
+
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"video_id": f"{l}_{v}"}}))
+        if len(updates) >= batch_size:
+            result = await _files().bulk_write(updates, ordered=False)
+            updated_count += result.modified_count
+            updates = []
 
-    return enriched_frames
+    if updates:
+        result = await _files().bulk_write(updates, ordered=False)
+        updated_count += result.modified_count
+
+    logger.info("Backfilled video_id on %d documents", updated_count)
+    return updated_count
 
 
 async def close_connection():
     """Close MongoDB connection."""
-    client.close()
+    global client, db, files_collection, video_metadata_collection
+
+    if client is not None:
+        await client.close()
+    client = db = files_collection = video_metadata_collection = None
@@ -4,11 +4,16 @@ VBS Simple Server - Minimal video frame search API
 """
 
 import os
+import asyncio
+import contextlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -23,6 +28,12 @@ HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 8000))
 DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 
+# Concurrent /search requests arriving within this window share one model/FAISS call
+SEARCH_BATCH_WINDOW_MS = float(os.getenv('SEARCH_BATCH_WINDOW_MS', '10'))
+
+# Per-request debug logging stays off unless DEBUG is set
+logging.basicConfig(level=logging.DEBUG if DEBUG else logging.WARNING)
+
 # Simple models
 class FrameRequest(BaseModel):
     frame_ids: List[str]
@@ -38,17 +49,87 @@ class VideoRequest(BaseModel):
 
 class SearchRequest(BaseModel):
     query: str
-    limit: int = 20
+    # Bounded: one batched FAISS call uses the largest limit of all queued requests
+    limit: int = Field(20, gt=0, le=1000)
+
+class SearchBatcher:
+    """
+    Coalesce concurrent text searches into batched search_engine calls.
+
+    Model loading and every search run on one dedicated thread: compiled
+    CUDA graphs are captured per thread and only replay on the thread that
+    warmed them up.
+    """
+
+    def __init__(self, window_ms: float, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def load_models(self) -> bool:
+        """Load search models on the inference thread."""
+        return self.executor.submit(search_engine.load_models).result()
+
+    def start(self):
+        # Created here so the queue belongs to the server's running loop
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+
+    async def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Queue a query and wait for its results."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, limit, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a query, then collect whatever else arrives within the window
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            queries = [query for query, _, _ in batch]
+            limit = max(limit for _, limit, _ in batch)
+            try:
+                # Inference runs off the event loop so database I/O keeps going
+                results = await loop.run_in_executor(
+                    self.executor, search_engine.search_text_batch, queries, limit
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
 
-class FrameResponse(BaseModel):
-    frames: List[Dict[str, Any]]
-    count: int
+            # Results are in FAISS rank order, so each query keeps its own top-limit
+            for (_, limit, future), query_results in zip(batch, results):
+                if not future.done():
+                    future.set_result(query_results[:limit])
+
+search_batcher = SearchBatcher(SEARCH_BATCH_WINDOW_MS, search_engine.MAX_BATCH_SIZE)
 
 # FastAPI app
 app = FastAPI(
     title="VBS Simple Server",
     description="Minimal video frame search API with FAISS search",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS for development
@@ -59,6 +140,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    """Connect to MongoDB on the server's event loop and prepare indexes."""
+    database.connect()
+    await database.ensure_indexes()
+    search_batcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the search batcher and close the MongoDB connection pool."""
+    await search_batcher.stop()
+    await database.close_connection()
+
 # Routes
 @app.get("/")
 async def root():
@@ -80,88 +174,69 @@ async def health_check():
         "search_engine": search_health
     }
 
-@app.post("/frames", response_model=FrameResponse)
+@app.post("/frames")
 async def get_frames_by_ids(request: FrameRequest):
     """Get frames by their IDs or S3 keys."""
     try:
         docs = await database.get_frames_by_s3_keys(request.frame_ids)
-        # Enrich frames with YouTube watch URLs
+        # Enrich frames with YouTube watch URLs and image_id
         docs = await database.enrich_frames_with_watch_urls(docs)
-        # Add image_id field to each document
-        frames_with_image_id = []
-        for doc in docs:
-            frame_doc = doc.copy()
-            frame_doc["image_id"] = frame_doc.get("frame_n", frame_doc.get("s3_key"))
-            frames_with_image_id.append(frame_doc)
-        return FrameResponse(frames=frames_with_image_id, count=len(frames_with_image_id))
+        # Returning a Response skips FastAPI's per-document jsonable_encoder pass
+        return ORJSONResponse({"frames": docs, "count": len(docs)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@app.post("/search", response_model=FrameResponse)
+@app.post("/search")
 async def search_text(request: SearchRequest):
     """Search frames using text embeddings and FAISS."""
     try:
         if not search_engine.is_loaded():
             raise HTTPException(status_code=503, detail="Search models not loaded")
         
-        # Perform text search
-        search_results = search_engine.search_text(request.query, request.limit)
+        # Perform text search, batched with concurrent requests
+        search_results = await search_batcher.search(request.query, request.limit)
         
         # Get frame metadata from database
         s3_keys = [result["s3_key"] for result in search_results]
         frame_docs = await database.get_frames_by_s3_keys(s3_keys)
         
-        # Enrich frames with YouTube watch URLs
+        # Enrich frames with YouTube watch URLs and image_id
         frame_docs = await database.enrich_frames_with_watch_urls(frame_docs)
         
-        # Combine search scores with frame metadata
+        # Combine search scores with frame metadata (FAISS returns each s3_key once)
         frames_with_scores = []
         frame_lookup = {doc["s3_key"]: doc for doc in frame_docs}
         
         for result in search_results:
-            s3_key = result["s3_key"]
-            if s3_key in frame_lookup:
-                frame_doc = frame_lookup[s3_key].copy()  # Create copy to avoid modifying original
+            frame_doc = frame_lookup.get(result["s3_key"])
+            if frame_doc is not None:
                 frame_doc["score"] = result["score"]
-                frame_doc["image_id"] = frame_doc.get("frame_n", s3_key)  # Use frame_n as image_id, fallback to s3_key
                 frames_with_scores.append(frame_doc)
         
-        return FrameResponse(frames=frames_with_scores, count=len(frames_with_scores))
+        return ORJSONResponse({"frames": frames_with_scores, "count": len(frames_with_scores)})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
-@app.post("/neighbors", response_model=FrameResponse)
+@app.post("/neighbors")
 async def get_neighbor_frames(request: NeighborRequest):
     """Get neighboring frames for a given frame using frame_n identifier."""
     try:
         docs = await database.find_neighbors(request.frame_id, request.limit)
-        # Enrich frames with YouTube watch URLs
+        # Enrich frames with YouTube watch URLs and image_id
         docs = await database.enrich_frames_with_watch_urls(docs)
-        # Add image_id field to each document
-        frames_with_image_id = []
-        for doc in docs:
-            frame_doc = doc.copy()
-            frame_doc["image_id"] = frame_doc.get("frame_n", frame_doc.get("s3_key"))
-            frames_with_image_id.append(frame_doc)
-        return FrameResponse(frames=frames_with_image_id, count=len(frames_with_image_id))
+        return ORJSONResponse({"frames": docs, "count": len(docs)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@app.post("/video-frames", response_model=FrameResponse)
+@app.post("/video-frames")
 async def get_video_frames(request: VideoRequest):
     """Get all frames from a specific video."""
     try:
         docs = await database.find_video_frames(request.l, request.v, request.limit)
-        # Enrich frames with YouTube watch URLs
+        # Enrich frames with YouTube watch URLs and image_id
         docs = await database.enrich_frames_with_watch_urls(docs)
-        # Add image_id field to each document
-        frames_with_image_id = []
-        for doc in docs:
-            frame_doc = doc.copy()
-            frame_doc["image_id"] = frame_doc.get("frame_n", frame_doc.get("s3_key"))
-            frames_with_image_id.append(frame_doc)
-        return FrameResponse(frames=frames_with_image_id, count=len(frames_with_image_id))
+        return ORJSONResponse({"frames": docs, "count": len(docs)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -182,8 +257,12 @@ async def get_by_id_legacy(data: Dict[str, Any]):
     if not frame_id:
         raise HTTPException(status_code=400, detail="Missing 'id' field")
     
-    frames = await get_frames_by_ids(FrameRequest(frame_ids=[frame_id]))
-    return {"item_count": frames.count, "frames": frames.frames}
+    try:
+        docs = await database.get_frames_by_s3_keys([frame_id])
+        docs = await database.enrich_frames_with_watch_urls(docs)
+        return ORJSONResponse({"item_count": len(docs), "frames": docs})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/neighbor")
 async def neighbor_legacy(data: Dict[str, Any]):
@@ -194,8 +273,12 @@ async def neighbor_legacy(data: Dict[str, Any]):
     if not frame_id:
         raise HTTPException(status_code=400, detail="Missing 'id' field")
     
-    neighbors = await get_neighbor_frames(NeighborRequest(frame_id=frame_id, limit=limit))
-    return {"item_count": neighbors.count, "frames": neighbors.frames}
+    try:
+        docs = await database.find_neighbors(frame_id, int(limit))
+        docs = await database.enrich_frames_with_watch_urls(docs)
+        return ORJSONResponse({"item_count": len(docs), "frames": docs})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 # Main execution
 if __name__ == "__main__":
@@ -205,7 +288,7 @@ if __name__ == "__main__":
     print(f"🔧 Loading search models...")
     
     # Load search models on startup
-    if search_engine.load_models():
+    if search_batcher.load_models():
         print(f"✅ Search models loaded successfully")
     else:
         print(f"⚠️ Search models failed to load (text search disabled)")
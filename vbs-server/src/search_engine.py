@@ -3,10 +3,14 @@
 import os
 import sys
 import json
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
 import torch
 import faiss
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Union
 from transformers import XLMRobertaTokenizer
 from dotenv import load_dotenv
 
@@ -18,6 +22,9 @@ os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 # Load environment variables
 load_dotenv()
 
+# Create logger for search operations
+logger = logging.getLogger(__name__)
+
 # Add BEiT3 path to sys.path (when running from vbs-server directory)
 BEIT3_PATH = os.path.abspath("./beit3")
 if os.path.exists(BEIT3_PATH):
@@ -29,15 +36,58 @@ MODEL_WEIGHT_PATH = os.getenv('MODEL_WEIGHT_PATH', './models/beit3_large_patch16
 FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', './models/batch1.bin')
 FRAME_IDS_PATH = os.getenv('FRAME_IDS_PATH', './models/batch1.json')
 MAX_LEN = int(os.getenv('MAX_LEN', '64'))
+# BEiT3 precision on CUDA: amp (fp32 weights, fp16 autocast), fp16, bf16 or fp32
+BEIT3_DTYPE = os.getenv('BEIT3_DTYPE', 'amp').lower()
+if BEIT3_DTYPE not in ('amp', 'fp16', 'bf16', 'fp32'):
+    print(f"⚠️ Unknown BEIT3_DTYPE={BEIT3_DTYPE!r} (expected amp, fp16, bf16 or fp32), using amp")
+    BEIT3_DTYPE = 'amp'
+# Largest number of queries encoded together by search_text_batch callers
+MAX_BATCH_SIZE = int(os.getenv('SEARCH_BATCH_MAX_SIZE', '32'))
+# Recall/latency knobs for approximate FAISS indexes (see scripts/rebuild_faiss_index.py)
+NPROBE = int(os.getenv('NPROBE', '16'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '64'))
+# Clone the FAISS index onto the GPU(s) when available (requires faiss-gpu)
+FAISS_USE_GPU = os.getenv('FAISS_USE_GPU', '0') == '1'
+# Number of recent query embeddings kept in memory
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+# Compile the BEiT3 forward with torch.compile on CUDA
+BEIT3_COMPILE = os.getenv('BEIT3_COMPILE', 'true').lower() == 'true'
+# INT8 dynamic quantization of BEiT3 linear layers on CPU (validate recall first)
+BEIT3_INT8 = os.getenv('BEIT3_INT8', '0') == '1'
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+autocast_dtype = torch.bfloat16 if BEIT3_DTYPE == 'bf16' else torch.float16
+use_autocast = device.type == 'cuda' and BEIT3_DTYPE != 'fp32'
 
 # Global model components
 tokenizer = None
 model = None
 faiss_index = None
 frame_ids = None
+# Uncompiled model while the compiled one serves, kept to fall back to
+_eager_model = None
+# Set once load_models() has finished successfully
+_loaded = False
+
+# Tokenizer special token ids, cached by load_models()
+BOS_ID = None
+EOS_ID = None
+PAD_ID = None
+
+# Pinned host buffers for token batches (CUDA only), reused under _inference_lock
+_token_buffer = None
+_padding_buffer = None
+_inference_lock = threading.Lock()
+# Side stream for host-to-device token copies (CUDA only) and the last copy's event
+_copy_stream = None
+_copy_done = None
+# True when faiss_index lives on the GPU and query embeddings stay there too
+_faiss_on_gpu = False
+
+# LRU cache of normalized query embeddings, shared by the search worker threads
+_query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_query_cache_lock = threading.Lock()
 
 
 def get_sentencepiece_model_for_beit3(model_path):
@@ -47,7 +97,19 @@ def get_sentencepiece_model_for_beit3(model_path):
 
 def load_models():
     """Load all model components."""
-    global tokenizer, model, faiss_index, frame_ids
+    global tokenizer, model, faiss_index, frame_ids, _token_buffer, _padding_buffer, _copy_stream
+    global _faiss_on_gpu, _loaded, _eager_model
+    global BOS_ID, EOS_ID, PAD_ID
+
+    _loaded = False
+    _faiss_on_gpu = False
+    _eager_model = None
+
+    # TF32 tensor-core matmuls and cuDNN autotuning (input shape is fixed at MAX_LEN)
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cudnn.deterministic = False
 
     try:
         # Load tokenizer with fallback
@@ -60,24 +122,103 @@ def load_models():
             tokenizer = XLMRobertaTokenizer.from_pretrained("xlm-roberta-base")
             print("✅ Fallback tokenizer loaded")
 
+        BOS_ID, EOS_ID, PAD_ID = tokenizer.bos_token_id, tokenizer.eos_token_id, tokenizer.pad_token_id
+        _tokenize_cached.cache_clear()
+        _query_cache.clear()
+
+        # Pinned staging buffers let token batches go to the GPU asynchronously
+        if device.type == 'cuda':
+            max_rows = 1 << (MAX_BATCH_SIZE - 1).bit_length()
+            _token_buffer = torch.empty((max_rows, MAX_LEN), dtype=torch.long, pin_memory=True)
+            _padding_buffer = torch.empty((max_rows, MAX_LEN), dtype=torch.long, pin_memory=True)
+            _copy_stream = torch.cuda.Stream()
+
         # Load BEiT3 model
         from modeling_finetune import beit3_large_patch16_384_retrieval
         model = beit3_large_patch16_384_retrieval(pretrained=True)
         checkpoint = torch.load(MODEL_WEIGHT_PATH, map_location=device)
         model.load_state_dict(checkpoint['model'])
         model.to(device)
+        if device.type == 'cuda' and BEIT3_DTYPE == 'fp16':
+            model.half()
+        elif device.type == 'cuda' and BEIT3_DTYPE == 'bf16':
+            model.to(torch.bfloat16)
+        elif device.type == 'cpu' and BEIT3_INT8:
+            # Dynamic quantization is CPU-only: int8 weights, activations quantized per call
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
         model.eval()
-        print(f"✅ BEiT3 large model loaded from {MODEL_WEIGHT_PATH}")
+        # BEIT3_DTYPE only applies on CUDA; CPU runs fp32 unless quantized
+        if device.type == 'cuda':
+            precision = BEIT3_DTYPE
+        else:
+            precision = 'int8' if BEIT3_INT8 else 'fp32'
+        print(f"✅ BEiT3 large model loaded from {MODEL_WEIGHT_PATH} ({precision} on {device.type})")
+
+        # Inputs are always (batch, MAX_LEN), so compile for static shapes.
+        # CUDA graphs are captured per thread: call load_models() and all
+        # inference from the same thread (main.SearchBatcher does this)
+        if BEIT3_COMPILE and device.type == 'cuda':
+            _eager_model = model
+            try:
+                model = torch.compile(model, mode='reduce-overhead', fullgraph=True, dynamic=False)
+                # Compilation and CUDA graph capture happen on the first calls for
+                # each shape, so cover every padded batch size before serving
+                batch_size = 1
+                while batch_size <= _token_buffer.shape[0]:
+                    for _ in range(2):
+                        _encode_uncached(["warmup"] * batch_size)
+                    batch_size *= 2
+                print("✅ BEiT3 compiled with torch.compile")
+            except Exception as e:
+                print(f"⚠️ torch.compile failed, using eager model: {e}")
+                model, _eager_model = _eager_model, None
 
         # Load FAISS index
         faiss_index = faiss.read_index(FAISS_INDEX_PATH)
         print(f"✅ FAISS index loaded from {FAISS_INDEX_PATH} ({faiss_index.ntotal} vectors)")
+        # Queries are L2-normalized, so inner product is cosine similarity and
+        # FAISS's result order (best first) is the ranking the API returns
+        if faiss_index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            print("⚠️ FAISS index does not use inner product; scores are not cosine "
+                  "similarities (rebuild with scripts/rebuild_faiss_index.py)")
+
+        # Search breadth for approximate indexes (flat indexes are exhaustive);
+        # set before any GPU cloning, which copies it
+        ivf_index = faiss.try_extract_index_ivf(faiss_index)
+        if ivf_index is not None:
+            ivf_index.nprobe = NPROBE
+            print(f"✅ IVF index: nprobe={NPROBE} of {ivf_index.nlist} lists")
+        elif isinstance(faiss_index, faiss.IndexHNSW):
+            faiss_index.hnsw.efSearch = HNSW_EF_SEARCH
+            print(f"✅ HNSW index: efSearch={HNSW_EF_SEARCH}")
+
+        # Optionally clone the index onto all GPUs (fp16 storage); the CPU
+        # index stays in use if cloning is unavailable or fails
+        if FAISS_USE_GPU and torch.cuda.is_available() and faiss.get_num_gpus() > 0:
+            try:
+                cloner_options = faiss.GpuMultipleClonerOptions()
+                cloner_options.useFloat16 = True
+                faiss_index = faiss.index_cpu_to_all_gpus(faiss_index, co=cloner_options)
+                # A single-GPU index can search CUDA tensors without a host round-trip;
+                # multi-GPU clones (IndexReplicas) are CPU-side wrappers and need numpy
+                if hasattr(faiss_index, "getDevice"):
+                    import faiss.contrib.torch_utils  # noqa: F401
+                    _faiss_on_gpu = True
+                print(f"✅ FAISS index moved to {faiss.get_num_gpus()} GPU(s)")
+            except Exception as e:
+                print(f"⚠️ Could not move FAISS index to GPU, using CPU index: {e}")
 
         # Load frame IDs
         with open(FRAME_IDS_PATH, 'r') as f:
-            frame_ids = json.load(f)
+            # Object array so search results map to ids with one fancy-index
+            frame_ids = np.asarray(json.load(f), dtype=object)
         print(f"✅ Frame IDs loaded from {FRAME_IDS_PATH} ({len(frame_ids)} frames)")
 
+        # Warm up so kernel selection happens at boot, not on the first user query
+        faiss_index.search(_encode_uncached(["warmup"]), 1)
+        print("✅ Text encoder and FAISS index warmed up")
+
+        _loaded = True
         return True
 
     except Exception as e:
@@ -87,148 +228,287 @@ def load_models():
 
 def is_loaded() -> bool:
     """Check if all models are loaded."""
-    return all([tokenizer, model, faiss_index, frame_ids])
+    return _loaded
+
 
+@lru_cache(maxsize=4096)
+def _tokenize_cached(tokenizer, text: str, max_tokens: int) -> Tuple[int, ...]:
+    """Tokenize text to at most max_tokens ids (without BOS/EOS), memoized."""
+    return tuple(tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text))[:max_tokens])
 
-def to_text_tokens(text: str, tokenizer, max_len: int = MAX_LEN) -> Tuple[torch.Tensor, torch.Tensor]:
+
+def to_text_tokens(texts: List[str], tokenizer, max_len: int = MAX_LEN) -> Tuple[torch.Tensor, torch.Tensor]:
     """
-    Convert text to tokens for BEiT3 model.
+    Convert a batch of texts to tokens for BEiT3 model.
 
     Args:
-        text: Input text
+        texts: Input texts
         tokenizer: BEiT3 tokenizer
         max_len: Maximum sequence length
 
     Returns:
-        Tuple of (token_ids_tensor, padding_mask_tensor)
+        Tuple of (token_ids_tensor, padding_mask_tensor), each of shape (len(texts), max_len)
     """
-    tokens_orig = tokenizer.tokenize(text)
-    token_ids = tokenizer.convert_tokens_to_ids(tokens_orig)
-    tokens = token_ids
-
-    if len(tokens) > max_len - 2:
-        tokens = tokens[:max_len - 2]
+    global _copy_done
+
+    num_texts = len(texts)
+    if _token_buffer is not None and num_texts <= _token_buffer.shape[0] and max_len == MAX_LEN:
+        # The previous batch's async copy must finish before the buffers are refilled
+        if _copy_done is not None:
+            _copy_done.synchronize()
+        token_ids_tensor = _token_buffer[:num_texts]
+        padding_mask_tensor = _padding_buffer[:num_texts]
+    else:
+        token_ids_tensor = torch.empty((num_texts, max_len), dtype=torch.long)
+        padding_mask_tensor = torch.empty((num_texts, max_len), dtype=torch.long)
+
+    # Fill through numpy views of the (possibly pinned) host tensors
+    token_ids = token_ids_tensor.numpy()
+    padding_mask = padding_mask_tensor.numpy()
+    token_ids.fill(PAD_ID)
+    padding_mask.fill(1)
+
+    for row, text in enumerate(texts):
+        tokens = _tokenize_cached(tokenizer, text, max_len - 2)
+        num_tokens = len(tokens) + 2
+        token_ids[row, 0] = BOS_ID
+        token_ids[row, 1:num_tokens - 1] = tokens
+        token_ids[row, num_tokens - 1] = EOS_ID
+        padding_mask[row, :num_tokens] = 0
+
+    if _copy_stream is None:
+        return (
+            token_ids_tensor.to(device, non_blocking=True),
+            padding_mask_tensor.to(device, non_blocking=True)
+        )
 
-    tokens = [tokenizer.bos_token_id] + tokens[:] + [tokenizer.eos_token_id]
-    num_tokens = len(tokens)
-    padding_mask = [0] * num_tokens + [1] * (max_len - num_tokens)
-    tokens_true = tokens + [tokenizer.pad_token_id] * (max_len - num_tokens)
+    # Copy on the side stream; the compute stream only waits for the copy event
+    with torch.cuda.stream(_copy_stream):
+        token_ids_device = token_ids_tensor.to(device, non_blocking=True)
+        padding_mask_device = padding_mask_tensor.to(device, non_blocking=True)
+        _copy_done = torch.cuda.Event()
+        _copy_done.record()
 
-    padding_mask_tensor = torch.tensor(padding_mask).reshape(1, -1).to(device)
-    token_ids_tensor = torch.tensor(tokens_true).reshape(1, -1).to(device)
+    compute_stream = torch.cuda.current_stream()
+    compute_stream.wait_event(_copy_done)
+    # Memory allocated on the copy stream is consumed on the compute stream
+    token_ids_device.record_stream(compute_stream)
+    padding_mask_device.record_stream(compute_stream)
 
-    return token_ids_tensor, padding_mask_tensor
+    return token_ids_device, padding_mask_device
 
 
-def calc_text_embedding(text: str, tokenizer) -> torch.Tensor:
+def calc_text_embedding(tokens: torch.Tensor, padding_mask: torch.Tensor) -> torch.Tensor:
     """
-    Calculate text embedding using BEiT3 model.
+    Calculate text embeddings using BEiT3 model.
 
     Args:
-        text: Input text
-        tokenizer: BEiT3 tokenizer
+        tokens: Token ids of shape (N, MAX_LEN)
+        padding_mask: Padding mask of shape (N, MAX_LEN)
 
     Returns:
-        Text embedding tensor
+        Text embedding tensor of shape (N, D)
     """
     if not model:
         raise RuntimeError("Model not loaded")
 
-    tokens, attention_mask = to_text_tokens(text, tokenizer)
-
-    with torch.no_grad():
+    with torch.inference_mode(), torch.autocast(device_type=device.type, dtype=autocast_dtype, enabled=use_autocast):
         outputs = model(
             text_description=tokens,
-            padding_mask=attention_mask,
+            padding_mask=padding_mask,
             only_infer=True
         )
 
     return outputs[1]  # Text embedding output
 
 
-def encode_text_query(text_query: str) -> np.ndarray:
+def _encode_uncached(text_queries: List[str]) -> Union[np.ndarray, torch.Tensor]:
     """
-    Encode text query into normalized embedding vector.
+    Run the model on text queries and return normalized (N, D) float32
+    embeddings: a CUDA tensor when the FAISS index is on GPU, else a numpy array.
+    """
+    global model, _eager_model
+
+    num_queries = len(text_queries)
+    texts = list(text_queries)
+    # Pad the batch to a power of two so the compiled model sees few shapes
+    if device.type == 'cuda':
+        texts += [""] * ((1 << (num_queries - 1).bit_length()) - num_queries)
+
+    # The lock serializes use of the pinned token buffers and of the model
+    # outputs, which compiled CUDA graphs overwrite on the next call
+    with _inference_lock:
+        tokens, padding_mask = to_text_tokens(texts, tokenizer)
+        try:
+            embeddings = calc_text_embedding(tokens, padding_mask)
+        except Exception as e:
+            if _eager_model is None:
+                raise
+            # A compiled model that breaks while serving is replaced for good
+            print(f"⚠️ Compiled BEiT3 failed, switching to eager model: {e}")
+            model, _eager_model = _eager_model, None
+            embeddings = calc_text_embedding(tokens, padding_mask)
+        # Back to float32 for FAISS regardless of inference precision
+        embeddings = embeddings[:num_queries].float()
+
+        if _faiss_on_gpu:
+            # Normalize on the GPU and hand the tensor straight to the GPU index
+            return torch.nn.functional.normalize(embeddings, dim=1).contiguous()
+
+        embeddings = embeddings.cpu().numpy()
+
+    # In-place SIMD row normalization (needs a contiguous float32 matrix)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def encode_text_query_batch(text_queries: List[str]) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Encode text queries into normalized embedding vectors, running one model
+    forward for the queries not already in the query cache.
 
     Args:
-        text_query: Input text query
+        text_queries: Input text queries
 
     Returns:
-        Normalized embedding vector as numpy array
+        Normalized float32 embeddings of shape (N, D): a CUDA tensor when the
+        FAISS index is on GPU, otherwise a numpy array
     """
     if not tokenizer:
         raise RuntimeError("Tokenizer not loaded")
 
-    text_embedding = calc_text_embedding(text_query, tokenizer).cpu().detach().numpy().flatten()
-    text_embedding = text_embedding / np.linalg.norm(text_embedding)
-    return text_embedding
+    embeddings = {}
+    with _query_cache_lock:
+        for query in text_queries:
+            if query in _query_cache:
+                _query_cache.move_to_end(query)
+                embeddings[query] = _query_cache[query]
+
+    missing = [query for query in dict.fromkeys(text_queries) if query not in embeddings]
+    if missing:
+        encoded = _encode_uncached(missing)
+        with _query_cache_lock:
+            for query, embedding in zip(missing, encoded):
+                if isinstance(embedding, np.ndarray):
+                    embedding = embedding.copy()
+                    embedding.flags.writeable = False
+                embeddings[query] = _query_cache[query] = embedding
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+
+    rows = [embeddings[query] for query in text_queries]
+    return torch.stack(rows) if _faiss_on_gpu else np.stack(rows)
+
+
+def encode_text_query(text_query: str) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Encode text query into normalized embedding vector.
+
+    Args:
+        text_query: Input text query
+
+    Returns:
+        Normalized float32 embedding of shape (1, D), ready to pass to vector_search
+    """
+    return encode_text_query_batch([text_query])
 
 
-def vector_search(query_embedding: np.ndarray, limit: int = 20) -> Tuple[List[str], List[float]]:
+def vector_search_batch(query_embeddings: Union[np.ndarray, torch.Tensor], limit: int = 20) -> List[Tuple[List[str], List[float]]]:
     """
-    Perform FAISS vector similarity search.
+    Perform FAISS vector similarity search for several queries at once.
 
     Args:
-        query_embedding: Query embedding vector
-        limit: Number of results to return
+        query_embeddings: Query embedding matrix of shape (N, D) from encode_text_query_batch
+        limit: Number of results to return per query
 
     Returns:
-        Tuple of (frame_ids, similarity_scores)
+        List of (frame_ids, similarity_scores) tuples, one per query
     """
-    if not faiss_index or not frame_ids:
+    if faiss_index is None or frame_ids is None:
         raise RuntimeError("FAISS index or frame IDs not loaded")
 
-    # Ensure query vector is the right shape
-    query_vector = query_embedding.reshape(1, -1).astype('float32')
+    # Perform FAISS search for all queries in one call
+    if isinstance(query_embeddings, torch.Tensor):
+        # GPU index searching a CUDA tensor (faiss.contrib.torch_utils)
+        distances, indices = faiss_index.search(query_embeddings, limit)
+        distances, indices = distances.cpu().numpy(), indices.cpu().numpy()
+    else:
+        # No copy when the embeddings are already contiguous float32
+        query_vectors = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        distances, indices = faiss_index.search(query_vectors, limit)
+
+    # FAISS pads missing results with -1; drop those and any id past frame_ids
+    valid = (indices >= 0) & (indices < frame_ids.shape[0])
 
-    # Perform FAISS search
-    distances, indices = faiss_index.search(query_vector, limit)
-    
     # Map indices to frame IDs with scores
+    results = []
+    for row_distances, row_indices, row_valid in zip(distances, indices, valid):
+        results_frame = frame_ids[row_indices[row_valid]].tolist()
+        results_scores = row_distances[row_valid].tolist()
+        logger.debug("FAISS search results (frames): %s", results_frame)
+        logger.debug("FAISS search results (scores): %s", results_scores)
+        results.append((results_frame, results_scores))
 
-    results_frame = []
-    results_scores = []
-    
-    for i, (score, idx) in enumerate(zip(distances[0], indices[0])):
-        if idx < len(frame_ids):
-            results_frame.append(frame_ids[idx])
-            results_scores.append(float(score))
-    print("FAISS search results (frames):", results_frame)
-    print("FAISS search results (scores):", results_scores)
-    return results_frame, results_scores
+    return results
 
 
-def search_text(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+def vector_search(query_embedding: Union[np.ndarray, torch.Tensor], limit: int = 20) -> Tuple[List[str], List[float]]:
     """
-    Perform complete text-to-image search.
+    Perform FAISS vector similarity search.
 
     Args:
-        query: Text search query
+        query_embedding: Query embedding of shape (1, D) from encode_text_query
         limit: Number of results to return
 
     Returns:
-        List of search results with frame IDs and scores
+        Tuple of (frame_ids, similarity_scores)
+    """
+    return vector_search_batch(query_embedding, limit)[0]
+
+
+def search_text_batch(queries: List[str], limit: int = 20) -> List[List[Dict[str, Any]]]:
+    """
+    Perform text-to-image search for several queries with one model forward
+    and one FAISS search.
+
+    Args:
+        queries: Text search queries
+        limit: Number of results to return per query
+
+    Returns:
+        List of search results (frame IDs and scores), one list per query
     """
     if not is_loaded():
         raise RuntimeError("Models not loaded. Call load_models() first.")
 
-    # Generate text embedding
-    text_embedding = encode_text_query(query)
+    # Generate text embeddings
+    text_embeddings = encode_text_query_batch(queries)
 
-    # Perform vector search
-    frame_ids_found, scores = vector_search(text_embedding, limit)
+    # Perform vector search; FAISS returns each row already ranked best-first
+    batch_results = []
+    for frame_ids_found, scores in vector_search_batch(text_embeddings, limit):
+        # Build results
+        results = []
+        for frame_id, score in zip(frame_ids_found, scores):
+            results.append({
+                "score": score,
+                "s3_key": frame_id  # frame_id from FAISS maps to s3_key for database lookup
+            })
+        batch_results.append(results)
 
-    # Build results
-    results = []
-    for frame_id, score in zip(frame_ids_found, scores):
-        results.append({
-            "score": score,
-            "s3_key": frame_id  # frame_id from FAISS maps to s3_key for database lookup
-        })
-    with open("./image_ids.csv","w") as f:
-        for result in results:
-            f.write(f"{result['image_id']}\n")
-    # Sort by score (lower distance = higher similarity)
-    results.sort(key=lambda x: x['score'], reverse=True)
+    return batch_results
 
-    return results
+
+def search_text(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Perform complete text-to-image search.
+
+    Args:
+        query: Text search query
+        limit: Number of results to return
+
+    Returns:
+        List of search results with frame IDs and scores
+    """
+    return search_text_batch([query], limit)[0]